@@ -3,9 +3,11 @@ Database Helper Functions
 
 MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
+Uses Motor so queries run asynchronously on FastAPI's event loop instead of
+blocking it the way synchronous PyMongo calls would.
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
@@ -21,12 +23,22 @@ db = None
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
+# Cursor batch size for list queries: a typical placement's logs fit in one
+# batch, so results arrive without extra getMore round-trips.
+BATCH_SIZE = 500
+
 if database_url and database_name:
-    _client = MongoClient(database_url)
+    _client = AsyncIOMotorClient(
+        database_url,
+        maxPoolSize=200,
+        minPoolSize=10,
+        serverSelectionTimeoutMS=2000,
+        connectTimeoutMS=2000,
+    )
     db = _client[database_name]
 
 # Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
+async def create_document(collection_name: str, data: Union[BaseModel, dict]):
     """Insert a single document with timestamp"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
@@ -40,16 +52,47 @@ def create_document(collection_name: str, data: Union[BaseModel, dict]):
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
 
-    result = db[collection_name].insert_one(data_dict)
+    result = await db[collection_name].insert_one(data_dict)
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+async def create_documents(collection_name: str, docs: list):
+    """Insert many documents with timestamps in one round-trip"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    now = datetime.now(timezone.utc)
+    prepared = []
+    for data in docs:
+        data_dict = data.model_dump() if isinstance(data, BaseModel) else data.copy()
+        data_dict['created_at'] = now
+        data_dict['updated_at'] = now
+        prepared.append(data_dict)
+
+    result = await db[collection_name].insert_many(prepared, ordered=False)
+    return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+async def exists(collection_name: str, filter_dict: dict) -> bool:
+    """Check whether a matching document exists without fetching it"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    return await db[collection_name].count_documents(filter_dict, limit=1) > 0
+
+async def get_documents(collection_name: str, filter_dict: dict = None, projection: dict = None, limit: int = None):
+    """Get documents from collection, optionally projecting a subset of fields"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    
-    cursor = db[collection_name].find(filter_dict or {})
+
+    cursor = db[collection_name].find(filter_dict or {}, projection, batch_size=BATCH_SIZE)
     if limit:
         cursor = cursor.limit(limit)
-    
-    return list(cursor)
+
+    return await cursor.to_list(length=limit)
+
+async def stream_documents(collection_name: str, filter_dict: dict = None, projection: dict = None):
+    """Iterate documents one at a time instead of materializing the full list"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    async for doc in db[collection_name].find(filter_dict or {}, projection, batch_size=BATCH_SIZE):
+        yield doc
@@ -12,9 +12,15 @@ Roles:
 - mahasiswa
 """
 
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, computed_field
 from typing import Optional, List, Literal
-from datetime import date, datetime
+from datetime import date, datetime, timezone
+
+# datetime.utcnow() is deprecated (and naive); read the clock tz-aware once
+_UTC = timezone.utc
+
+def _now_utc() -> datetime:
+    return datetime.now(_UTC)
 
 # ---------------------------------------------
 # MASTER DATA
@@ -63,7 +69,7 @@ class Log(BaseModel):
     activities: str = Field(..., description="Ringkasan aktivitas/tugas")
     hours: float = Field(..., ge=0, le=24, description="Jumlah jam kerja hari itu")
     evidence_photo_url: Optional[str] = Field(None, description="URL bukti foto")
-    uploaded_at: Optional[datetime] = None
+    uploaded_at: datetime = Field(default_factory=_now_utc)
     status: Literal["submitted", "approved", "rejected"] = "submitted"
     reviewer_id: Optional[str] = None
     reviewer_note: Optional[str] = None
@@ -73,7 +79,7 @@ class Attendance(BaseModel):
     date: date
     status: Literal["hadir", "izin", "sakit", "alpa"] = "hadir"
     evidence_photo_url: Optional[str] = Field(None, description="URL bukti foto")
-    uploaded_at: Optional[datetime] = None
+    uploaded_at: datetime = Field(default_factory=_now_utc)
 
 class Evaluation(BaseModel):
     placement_id: str
@@ -83,9 +89,13 @@ class Evaluation(BaseModel):
     disiplin: float = Field(..., ge=0, le=100)
     soft_skills: float = Field(..., ge=0, le=100)
     laporan: float = Field(..., ge=0, le=100)
-    total: Optional[float] = None
     notes: Optional[str] = None
 
+    @computed_field
+    @property
+    def total(self) -> float:
+        return round(0.4 * self.teknis + 0.2 * self.disiplin + 0.2 * self.soft_skills + 0.2 * self.laporan, 2)
+
 class Notification(BaseModel):
     user_id: str
     title: str